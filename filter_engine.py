@@ -2,13 +2,21 @@
 
 import re
 import json
-from datetime import datetime
+import mmap
+import logging
+from functools import lru_cache
+from datetime import datetime, date
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterator, Tuple
+
+try:
+    import orjson # Optional: much faster JSON serialisation for the output file
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__) # Per-block errors only (formatted lazily); per-run messages stay on print like the rest of the app
 
 # --- Constants ---
-# (Keep constants as before)
-TENDER_BLOCK_PATTERN = re.compile(r"^\d+\.\s*$")
 INDIAN_STATES = ["Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh",
     "Goa", "Gujarat", "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka",
     "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur", "Meghalaya",
@@ -17,7 +25,12 @@ INDIAN_STATES = ["Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhat
     "West Bengal", "Delhi", "Jammu and Kashmir", "Ladakh", "Puducherry",
     "Chandigarh", "Andaman and Nicobar Islands", "Dadra and Nagar Haveli and Daman and Diu", "Lakshadweep"
 ]
-TWO_BRACKET_ID_REGEX = re.compile(r"^\s*\[[^\]]+\]\s*\[(\d{4}_\w+_\d+_\d+)\]\s*$")
+# State detection: whole-word, case-insensitive lookup of state names starting at each word of the department
+STATE_LOOKUP = {s.lower(): s for s in INDIAN_STATES}
+STATE_RANK = {s: i for i, s in enumerate(INDIAN_STATES)} # Earlier list entries win, as with the old per-state loop
+# Candidate name lengths bucketed by first letter, e.g. "a" -> lengths of "assam", "andhra pradesh", ...
+STATE_NAME_LENGTHS_BY_INITIAL = {initial: sorted({len(s) for s in STATE_LOOKUP if s[0] == initial}) for initial in {s[0] for s in STATE_LOOKUP}}
+WORD_REGEX = re.compile(r"\w+")
 TAG_REGEX = {
     "Date": re.compile(r"<[Dd][Aa][Tt][Ee]>\s*(.*?)\s*</[Dd][Aa][Tt][Ee]>", re.DOTALL),
     "Title": re.compile(r"<[Tt][Ii][Tt][Ll][Ee]>\s*(.*?)\s*</[Tt][Ii][Tt][Ll][Ee]>", re.DOTALL),
@@ -25,127 +38,210 @@ TAG_REGEX = {
     "Department": re.compile(r"<[Dd][Ee][Pp][Aa][Rr][Tt][Mm][Ee][Nn][Tt]>\s*(.*?)\s*</[Dd][Ee][Pp][Aa][Rr][Tt][Mm][Ee][Nn][Tt]>", re.DOTALL),
     "Link": re.compile(r"<[Ll][Ii][Nn][Kk]>\s*(.*?)\s*</[Ll][Ii][Nn][Kk]>", re.DOTALL),
 }
-ORG_KEYWORDS = ["Authority", "Limited", "Department", "..."] # Add full list back
-
-def parse_tender_blocks_from_tagged_file(file_path: Path) -> List[str]:
-    # (Keep implementation as before)
-    if not file_path.is_file(): print(f"[FE] ERROR: File not found {file_path}"); return []
-    try: content = file_path.read_text(encoding="utf-8", errors='ignore')
-    except Exception as e: print(f"[FE] ERROR: Read failed {file_path}: {e}"); return []
-    raw_blocks = [b for b in content.split("--- TENDER START ---") if b.strip()]
-    processed_blocks = [re.sub(r"--- TENDER END ---.*", "", b, flags=re.DOTALL).strip() for b in raw_blocks]
-    print(f"[FE] DEBUG: Split {len(processed_blocks)} blocks from {file_path.name}")
-    return [b for b in processed_blocks if b]
-
-def extract_tender_info_from_tagged_block(block_text: str) -> Dict[str, Any]:
-     # (Keep implementation as before)
+TAG_FIELDS = {"title": "Title", "tender_id": "ID", "department": "Department", "link": "Link"} # Output field -> TAG_REGEX key
+DATE_FIELDS = ("start_date", "end_date", "opening_date")
+# Exact-case tags as written by scrape.py, for the str.find fast path
+TAG_MARKERS = {"title": ("<Title>", "</Title>"), "tender_id": ("<ID>", "</ID>"), "department": ("<Department>", "</Department>"), "link": ("<Link>", "</Link>")}
+BLOCK_START_MARKER = b"--- TENDER START ---"
+BLOCK_END_MARKER = b"--- TENDER END ---"
+MONTH_NUMBERS = {m: i for i, m in enumerate(("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1)}
+NEVER_MATCHES_REGEX = re.compile(r"(?!)")
+REGEX_METACHAR_REGEX = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+def parse_tender_blocks_from_tagged_file(file_path: Path) -> Iterator[str]:
+    """Yields the non-empty text of each tagged tender block, one at a time."""
+    if not file_path.is_file(): print(f"[FE] ERROR: File not found {file_path}"); return
+    block_count = 0
+    try:
+        with open(file_path, "rb") as f:
+            if f.seek(0, 2) == 0: return # mmap cannot map an empty file
+            # Scan the mapped bytes for block delimiters; only each block's own bytes get decoded
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                pos = 0
+                while True:
+                    next_start = mm.find(BLOCK_START_MARKER, pos)
+                    segment_end = next_start if next_start != -1 else len(mm)
+                    block_end = mm.find(BLOCK_END_MARKER, pos, segment_end)
+                    block = mm[pos:block_end if block_end != -1 else segment_end].decode("utf-8", errors="ignore").strip()
+                    if block: block_count += 1; yield block
+                    if next_start == -1: break
+                    pos = next_start + len(BLOCK_START_MARKER)
+    except Exception as e: print(f"[FE] ERROR: Read failed {file_path}: {e}"); return
+    print(f"[FE] DEBUG: Split {block_count} blocks from {file_path.name}")
+
+def slice_tag_values(block_text: str) -> Tuple[List[str], Dict[str, str]]:
+    """Fast path: pulls up to three dates and the other tag values with plain str.find slicing (exact-case tags only)."""
+    dates: List[str] = []; fields: Dict[str, str] = {}; pos = 0
+    while len(dates) < len(DATE_FIELDS):
+        start = block_text.find("<Date>", pos)
+        if start == -1: break
+        end = block_text.find("</Date>", start + 6)
+        if end == -1: break
+        dates.append(block_text[start + 6:end].strip()); pos = end + 7
+    for field, (open_tag, close_tag) in TAG_MARKERS.items():
+        start = block_text.find(open_tag)
+        if start == -1: continue
+        end = block_text.find(close_tag, start + len(open_tag))
+        if end != -1: fields[field] = block_text[start + len(open_tag):end].strip()
+    return dates, fields
+
+def extract_tender_info_from_tagged_block(block_text: str, filter_fields: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # Exact-case str.find slicing first, the per-tag regex searches when that cannot be trusted.
+    # filter_fields: start_date/state already taken by extract_filter_fields; reused so the output shows what was filtered on
     tender: Dict[str, Any] = {"start_date": "N/A", "end_date": "N/A", "opening_date": "N/A", "title": "N/A", "tender_id": "N/A", "department": "N/A", "state": "N/A", "link": "N/A"}
-    try: dates = TAG_REGEX["Date"].findall(block_text); tender["start_date"] = dates[0].strip(); tender["end_date"] = dates[1].strip(); tender["opening_date"] = dates[2].strip()
-    except IndexError: pass
-    except Exception as e: print(f"[FE] ERROR extracting Dates: {e}")
-    try: title_match = TAG_REGEX["Title"].search(block_text); tender["title"] = title_match.group(1).strip() if title_match else "N/A"
-    except Exception as e: print(f"[FE] ERROR extracting Title: {e}")
-    try: id_match = TAG_REGEX["ID"].search(block_text); tender["tender_id"] = id_match.group(1).strip() if id_match else "N/A"
-    except Exception as e: print(f"[FE] ERROR extracting ID: {e}")
-    try: dept_match = TAG_REGEX["Department"].search(block_text); tender["department"] = dept_match.group(1).strip() if dept_match else "N/A"
-    except Exception as e: print(f"[FE] ERROR extracting Department: {e}")
-    try: link_match = TAG_REGEX["Link"].search(block_text); tender["link"] = link_match.group(1).strip() if link_match else "N/A"
-    except Exception as e: print(f"[FE] ERROR extracting Link: {e}")
-    if tender["department"] != "N/A":
+    if "<" not in block_text: return tender # No tags at all, nothing to extract (filter_fields are all "N/A" then too)
+    dates, fields = slice_tag_values(block_text)
+    # Exact-case slices are only trusted when they used every "<" in the block and none leaked into a value;
+    # anything else (missing, extra or other-case tags, nested markup) goes to independent case-insensitive searches
+    # per tag, as the baseline did (so a tag nested inside another tag's value is still picked up on its own)
+    if (len(dates) < len(DATE_FIELDS) or len(fields) < len(TAG_MARKERS) or block_text.count("<") != 2 * (len(dates) + len(fields))
+            or any("<" in value for value in dates) or any("<" in value for value in fields.values())):
+        dates = []; fields = {}
         try:
-            for state_name in INDIAN_STATES:
-                if re.search(r'\b' + re.escape(state_name) + r'\b', tender["department"], re.IGNORECASE): tender["state"] = state_name; break
-        except Exception as e: print(f"[FE] ERROR extracting State: {e}")
+            dates = [d.strip() for d in TAG_REGEX["Date"].findall(block_text)[:len(DATE_FIELDS)]]
+            for field, tag in TAG_FIELDS.items():
+                tag_match = TAG_REGEX[tag].search(block_text) # First occurrence wins
+                if tag_match: fields[field] = tag_match.group(1).strip()
+        except Exception as e: logger.error("[FE] ERROR extracting tags: %s", e)
+    for date_field, date_value in zip(DATE_FIELDS, dates): tender[date_field] = date_value
+    tender.update(fields)
+    if filter_fields is not None: tender.update(filter_fields) # State already detected, no second detect_state
+    elif tender["department"] != "N/A":
+        try: tender["state"] = detect_state(tender["department"])
+        except Exception as e: logger.error("[FE] ERROR extracting State: %s", e)
     return tender
 
+def extract_filter_fields(block_text: str) -> Tuple[Dict[str, Any], Optional[date]]:
+    """
+    Extracts only what the date/state filters look at: the ePublish (first) date and the state.
+    Also returns the parsed ePublish date (None when missing or unparseable).
+    """
+    fields: Dict[str, Any] = {"start_date": "N/A", "state": "N/A"}; publish_date = None
+    date_match = TAG_REGEX["Date"].search(block_text)
+    if date_match:
+        fields["start_date"] = date_match.group(1).strip()
+        if fields["start_date"] and fields["start_date"] != "N/A": publish_date = parse_publish_date(fields["start_date"].split(" ")[0])
+    dept_match = TAG_REGEX["Department"].search(block_text)
+    if dept_match:
+        department = dept_match.group(1).strip()
+        if department != "N/A": fields["state"] = detect_state(department)
+    return fields, publish_date
+
+
+def parse_tender_date(date_str: str) -> date:
+    """Parses a DD-Mon-YYYY tender date (e.g. 04-Apr-2025). Hand-rolled: strptime is far slower per call."""
+    day, month, year = date_str.split("-")
+    if not (day.isdigit() and len(day) <= 2 and year.isdigit() and len(year) == 4 and month.lower() in MONTH_NUMBERS):
+        raise ValueError(f"'{date_str}' is not a DD-Mon-YYYY date")
+    return date(int(year), MONTH_NUMBERS[month.lower()], int(day))
+
 
-# --- CORRECTED matches_filters function ---
-def matches_filters(tender: Dict[str, Any], keywords: List[str], use_regex: bool, state_filter: Optional[str], start_date_str: Optional[str], end_date_str: Optional[str]) -> bool:
+@lru_cache(maxsize=4096)
+def parse_publish_date(date_part_str: str) -> Optional[date]:
+    """Cached parse_tender_date: tenders published together share the same date. Returns None when unparseable."""
+    try: return parse_tender_date(date_part_str)
+    except ValueError: return None
+
+
+def detect_state(department: str) -> str:
+    """Returns the first INDIAN_STATES entry named as a whole word in the department text, or "N/A"."""
+    text = department.lower(); text_len = len(text); found: Optional[str] = None
+    for word in WORD_REGEX.finditer(text):
+        start = word.start()
+        for length in STATE_NAME_LENGTHS_BY_INITIAL.get(text[start], ()): # Only names sharing this word's initial
+            end = start + length
+            if end > text_len: break
+            state_name = STATE_LOOKUP.get(text[start:end])
+            if not state_name or (end < text_len and (text[end].isalnum() or text[end] == "_")): continue
+            if found is None or STATE_RANK[state_name] < STATE_RANK[found]: found = state_name
+    return found or "N/A"
+
+
+def matches_filters(tender: Dict[str, Any], keywords: List[Any]) -> bool:
     """
-    Checks if a parsed tender dictionary matches the filter criteria.
-    Applies BOTH start and end date filters against the E-PUBLISH DATE.
-    Uses DD-Mon-YYYY format for parsing tender dates.
+    Checks if a parsed tender dictionary matches the keyword filter (state/date are checked earlier by run_filter).
+    Keywords are prepared once per run by run_filter: lowercase strings are substring-matched against the lowered
+    text; anything else is a compiled case-insensitive pattern (regex mode only).
     """
-    # State Filter
-    if state_filter and state_filter.lower() not in tender.get("state", "N/A").lower():
-        return False
+    if not keywords: return True # Search text is only built when there are keywords to match
+    # Every field is always present (defaults to "N/A") and already a string
+    search_content = f'{tender["title"]} {tender["tender_id"]} {tender["department"]} {tender["state"]} {tender["link"]}'
+    content_lower = search_content.lower()
+    return any(kw in content_lower if isinstance(kw, str) else kw.search(search_content) for kw in keywords)
 
-    # Date Filtering
-    tender_date_format = "%d-%b-%Y" # Format like 04-Apr-2025
-    filter_date_format = "%Y-%m-%d" # Format from HTML form date input
 
-    tender_publish_date = None
-    tender_publish_date_str = tender.get("start_date", "") # ePublish date
-    if tender_publish_date_str and tender_publish_date_str != "N/A":
-        try:
-            # Try parsing only the date part first, assuming format might vary
-            date_part_str = tender_publish_date_str.split(" ")[0]
-            tender_publish_date = datetime.strptime(date_part_str, tender_date_format).date()
-        except ValueError:
-            print(f"[Filter Engine] WARNING: Could not parse ePublish Date '{tender_publish_date_str}' with format '{tender_date_format}'. Skipping date filters.")
-            tender_publish_date = None
-
-    # Apply Start Date Filter
-    if start_date_str and tender_publish_date:
-        try: # Needs its own try block
-            filter_start_date = datetime.strptime(start_date_str, filter_date_format).date()
-            if tender_publish_date < filter_start_date:
-                return False
-        # --- ADDED THIS BLOCK BACK ---
-        except ValueError:
-             print(f"[Filter Engine] WARNING: Could not parse filter Start Date '{start_date_str}'")
-             pass # Ignore this specific filter check if user input is bad
-        # --- END ADDED BLOCK ---
-
-    # Apply End Date Filter
-    if end_date_str and tender_publish_date:
-        try: # Needs its own try block
-            filter_end_date = datetime.strptime(end_date_str, filter_date_format).date()
-            if tender_publish_date > filter_end_date:
-                return False
-        except ValueError:
-             print(f"[Filter Engine] WARNING: Could not parse filter End Date '{end_date_str}'")
-             pass # Ignore this specific filter check if user input is bad
-
-    # Keyword Filter
-    # (No changes needed here)
-    search_content = " ".join(str(tender.get(k, "")) for k in ["title", "tender_id", "department", "state", "link"])
-    if keywords:
-        if not search_content: return False
-        try:
-            if use_regex:
-                if not any(re.search(kw, search_content, re.IGNORECASE) for kw in keywords): return False
-            else:
-                content_lower = search_content.lower()
-                if not any(kw.lower() in content_lower for kw in keywords): return False
+def parse_filter_date(date_str: Optional[str], label: str) -> Optional[date]:
+    """Parses a YYYY-MM-DD date from the filter form once per run. Bad input disables that filter, as before."""
+    if not date_str: return None
+    try: return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        print(f"[Filter Engine] WARNING: Could not parse filter {label} Date '{date_str}'")
+        return None
+
+
+def compile_keyword_patterns(keywords: List[str]) -> List[Any]:
+    """
+    Prepares regex keywords once per run. Plain ASCII words (no regex metacharacters) become lowercase strings for a
+    substring test; the rest are compiled case-insensitively. Matching stops at the first invalid pattern, as it always has.
+    """
+    literals = []; patterns = []
+    for kw in keywords:
+        if kw.isascii() and not REGEX_METACHAR_REGEX.search(kw):
+            literals.append(kw.lower()); continue
+        try: patterns.append(re.compile(kw, re.IGNORECASE))
         except re.error as e:
             print(f"[Filter Engine] ERROR: Invalid regex: {e}")
-            return False
-
-    return True
+            patterns.append(NEVER_MATCHES_REGEX) # Keeps the list non-empty so the keyword filter still applies
+            break
+    # Fuse into one alternation so each tender costs a single search. Skipped when any keyword has groups (fusing would
+    # renumber its backreferences) or inline flags such as (?x): before Python 3.11 a mid-pattern global flag only
+    # warns and then applies to every fused keyword. Patterns that fail to fuse stay separate.
+    if len(patterns) > 1 and not any(p.groups or p.flags & ~(re.IGNORECASE | re.UNICODE) for p in patterns):
+        try: patterns = [re.compile("|".join(f"(?:{p.pattern})" for p in patterns), re.IGNORECASE)]
+        except re.error: pass
+    return literals + patterns
 
 
 def run_filter(base_folder: Path, tender_filename: str, keywords: list, use_regex: bool, filter_name: str, state: str, start_date: str, end_date: str) -> str:
     """Runs the filtering process using tagged input file and saves results as JSON."""
-    # (No changes needed here)
     print("--- Running Filter (Engine v3.4: Corrected Date Filter Syntax) ---")
     print(f"  Source File: {tender_filename}")
     # ... (rest of print statements) ...
     print("-----------------------------------------------------------------")
 
     tender_path = base_folder / tender_filename
-    tagged_blocks = parse_tender_blocks_from_tagged_file(tender_path)
-    if not tagged_blocks: print("[FE] WARNING: No blocks parsed.")
+    tagged_blocks = parse_tender_blocks_from_tagged_file(tender_path) # Streamed: each block is dropped once checked
 
+    if not use_regex: keywords = [kw.lower() for kw in keywords] # Lowered once here, not per tender
+    else: keywords = compile_keyword_patterns(keywords)
     matching_tender_dictionaries: List[Dict[str, Any]] = []
-    processed_count = 0; match_count = 0
+    processed_count = 0; match_count = 0; unparseable_date_count = 0
+    filter_start_date = parse_filter_date(start_date, "Start"); filter_end_date = parse_filter_date(end_date, "End")
+    has_date_filter = bool(filter_start_date or filter_end_date)
+    has_date_or_state_filter = bool(state) or has_date_filter
+    # A detected state is spelled out in the block's Department, so blocks never mentioning the filter text cannot match
+    # (unless the filter text also matches the "N/A" placeholder)
+    state_lower = state.lower() if state else ""
+    use_state_precheck = bool(state_lower) and state_lower not in "n/a"
     for block_text in tagged_blocks:
         processed_count += 1
-        tender_info = extract_tender_info_from_tagged_block(block_text)
-        if matches_filters(tender_info, keywords, use_regex, state, start_date, end_date):
+        if use_state_precheck and state_lower not in block_text.lower(): continue
+        # Reject on date/state first; only surviving blocks pay for the full extraction
+        if has_date_or_state_filter:
+            filter_fields, publish_date = extract_filter_fields(block_text)
+            if state and state_lower not in filter_fields["state"].lower(): continue
+            if has_date_filter:
+                if publish_date is None:
+                    # Date filters are skipped for it; counted here and reported once after the loop
+                    if filter_fields["start_date"] not in ("", "N/A"): unparseable_date_count += 1
+                elif (filter_start_date and publish_date < filter_start_date) or (filter_end_date and publish_date > filter_end_date): continue
+        tender_info = extract_tender_info_from_tagged_block(block_text, filter_fields if has_date_or_state_filter else None)
+        if matches_filters(tender_info, keywords):
             matching_tender_dictionaries.append(tender_info)
             match_count += 1
 
+    if not processed_count: print("[FE] WARNING: No blocks parsed.")
+    if unparseable_date_count: print(f"[FE] WARNING: Skipped date filters for {unparseable_date_count} tenders with unparseable ePublish dates.")
     print(f"[FE] Processed {processed_count} blocks, found {match_count} matching.")
     output_folder = base_folder / "Filtered Tenders" / f"{filter_name} Tenders"
     output_folder.mkdir(parents=True, exist_ok=True)
@@ -153,8 +249,10 @@ def run_filter(base_folder: Path, tender_filename: str, keywords: list, use_rege
     output_path = output_folder / output_filename
     try:
         print(f"[FE] Saving {match_count} dicts to: {output_path}")
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(matching_tender_dictionaries, f, indent=2, ensure_ascii=False)
+        # Serialise in one go and write once (orjson emits UTF-8 bytes directly)
+        if orjson is not None: payload = orjson.dumps(matching_tender_dictionaries, option=orjson.OPT_INDENT_2)
+        else: payload = json.dumps(matching_tender_dictionaries, indent=2, ensure_ascii=False).encode("utf-8")
+        output_path.write_bytes(payload)
     except Exception as e:
         print(f"[FE] ERROR: Failed write {output_path}: {e}")
         raise IOError(f"Failed write output JSON: {e}") from e
@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
 
 import asyncio
+import atexit
 import datetime
+import hashlib
 import logging
+import queue
 import re
+import time
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from typing import Tuple, Optional, Dict, Set, List
 from urllib.parse import urljoin # <-- Import urljoin
 
-from bs4 import BeautifulSoup, Tag
+from lxml import etree, html
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeout
 
 # === CONFIGURATION ===
@@ -18,255 +23,337 @@ except NameError:
     SCRIPT_DIR = Path('.').resolve()
 
 BASE_DATA_DIR = SCRIPT_DIR / "scraped_data"
-RAW_PAGES_DIR = BASE_DATA_DIR / "RawPages"
 LOG_DIR = SCRIPT_DIR / "logs"
 
 BASE_URL = "https://eprocure.gov.in/eprocure/app?component=%24TablePages.linkPage&page=FrontEndAdvancedSearchResult&service=direct&session=T&sp=AFrontEndAdvancedSearchResult%2Ctable&sp={}"
 SITE_DOMAIN = "https://eprocure.gov.in" # <-- Base domain for joining relative URLs
+MAIN_PAGE_URL = "https://eprocure.gov.in/eprocure/app" # Visited once per page to open the search session
 MAX_PAGES_TO_FETCH = 150
 RETRY_LIMIT = 3
 CONCURRENCY = 10
 PAGE_LOAD_TIMEOUT = 20000
+PAGES_PER_CONTEXT = 10 # Each worker swaps in a fresh browser context after this many pages to cap memory growth
+                       # (below MAX_PAGES_TO_FETCH / CONCURRENCY, so a full run recycles every worker at least once)
+BLOCKED_RESOURCE_TYPES = {"image", "font", "stylesheet", "media"} # Not needed to read the tender table
 
 # === LOG CONFIG ===
-# ... (logging setup remains the same) ...
+# Daily date header in the log file; records reach the file and console handlers through a background queue listener
 LOG_FILE = LOG_DIR / "scrape.log"
+LOG_HEADER_MARKER = LOG_DIR / ".header_date" # Date of the last header written, so the log never has to be re-read
 TODAY_STR = datetime.datetime.now().strftime("%Y-%m-%d")
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 BASE_DATA_DIR.mkdir(parents=True, exist_ok=True)
-RAW_PAGES_DIR.mkdir(parents=True, exist_ok=True)
 def ensure_date_header():
-    # ... (same as before) ...
-    if LOG_FILE.exists():
+    if LOG_FILE.exists() and LOG_HEADER_MARKER.exists():
         try:
-            with open(LOG_FILE, "r", encoding='utf-8') as f:
-                if f"======== {TODAY_STR} ========" in f.read(): return
-        except Exception as e: print(f"Warning: Could not read log file {LOG_FILE}: {e}")
+            if LOG_HEADER_MARKER.read_text(encoding='utf-8').strip() == TODAY_STR: return
+        except Exception as e: logging.warning("Could not read header marker %s: %s", LOG_HEADER_MARKER, e)
     try:
         with open(LOG_FILE, "a", encoding='utf-8') as f: f.write(f"\n\n======== {TODAY_STR} ========\n")
-    except Exception as e: print(f"Warning: Could not write header to log file {LOG_FILE}: {e}")
-ensure_date_header()
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%H:%M:%S",
-    handlers=[ logging.FileHandler(LOG_FILE, encoding='utf-8'), logging.StreamHandler() ]
-)
+        LOG_HEADER_MARKER.write_text(TODAY_STR, encoding='utf-8')
+    except Exception as e: logging.warning("Could not write header to log file %s: %s", LOG_FILE, e)
+# delay: the log file is only opened on the first record, after the date header below has been written
+LOG_HANDLERS = [ logging.FileHandler(LOG_FILE, encoding='utf-8', delay=True), logging.StreamHandler() ]
+for log_handler in LOG_HANDLERS: log_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S"))
+# Workers only enqueue records; a background listener thread formats and writes them
+LOG_QUEUE = queue.SimpleQueue()
+queue_handler = QueueHandler(LOG_QUEUE); queue_handler.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+LOG_LISTENER = QueueListener(LOG_QUEUE, *LOG_HANDLERS, respect_handler_level=True)
+LOG_LISTENER.start(); atexit.register(LOG_LISTENER.stop) # stop() drains the queue before exit
+ensure_date_header() # After basicConfig so its warnings go through logging
 # === END LOG CONFIG ===
 
 # --- Regex Definitions ---
-BRACKET_CONTENT_REGEX = re.compile(r"\[(.*?)\]")
-# STRICTLY matches the required ID format: 2025_WORD_NUM_NUM
-STRICT_ID_CONTENT_REGEX = re.compile(r"^2025_\w+_\d+_\d+$")
-
-def get_safe_text(element: Optional[Tag], default="N/A") -> str:
-    return element.get_text(strip=True) if element else default
+# One pass over the title/ID cell: each [bracket] on a line, contents stripped. Contents STRICTLY matching the
+# required ID format (2025_WORD_NUM_NUM) land in "id", anything else in "other"
+CELL_BRACKET_REGEX = re.compile(r"\[[^\S\n]*(?:(?P<id>2025_\w+_\d+_\d+)|(?P<other>[^\]\n]*?))[^\S\n]*\]")
+
+# Layout of one tender in the output file, delimiters included (read back by filter_engine.py)
+TAGGED_BLOCK_TEMPLATE = (
+    "--- TENDER START ---\n"
+    "{serial_no}\n"
+    "<Date>{epub_date}</Date>\n"
+    "<Date>{closing_date}</Date>\n"
+    "<Date>{opening_date}</Date>\n"
+    "<Title>{title}</Title>\n"
+    "<ID>{tender_id}</ID>\n"
+    "<Link>{link}</Link>\n"
+    "<Department>{department}</Department>\n"
+    "--- TENDER END ---\n\n"
+)
 
-def natural_sort_key(filename: str) -> int:
-    match = re.search(r"(\d+)", filename)
-    return int(match.group(1)) if match else 0
+# --- XPath Definitions (compiled once, evaluated in C) ---
+TENDER_TABLE_XPATH = etree.XPath("//table[@id='table']")
+TENDER_ROWS_XPATH = etree.XPath(".//tr[starts-with(@id, 'informal')]") # Row ids are prefixed "informal"
+CELLS_XPATH = etree.XPath(".//td")
+LINK_XPATH = etree.XPath(".//a")
+TEXT_XPATH = etree.XPath(".//text()")
+
+def get_safe_text(element: Optional[html.HtmlElement], default="N/A") -> str:
+    return "".join(text.strip() for text in TEXT_XPATH(element)) if element is not None else default
+
+def get_cell_lines(element: html.HtmlElement) -> str:
+    """Non-empty stripped text pieces of the element, one per line."""
+    return "\n".join(text for text in (piece.strip() for piece in TEXT_XPATH(element)) if text)
+
+def page_fingerprint(tender_ids: List[str], tagged_page_content: str) -> bytes:
+    """Order-independent page fingerprint from its sorted tender IDs (whole content if any row lacks an ID)."""
+    data = tagged_page_content if "N/A" in tender_ids else "|".join(sorted(tender_ids))
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).digest()
+
+async def block_heavy_resources(route):
+    """Route handler: aborts requests the scraper never looks at."""
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES: await route.abort()
+    else: await route.continue_()
+
+async def open_worker_page(browser):
+    """New browser page, in its own context, with heavy resources blocked."""
+    page = await browser.new_page()
+    page.set_default_navigation_timeout(PAGE_LOAD_TIMEOUT) # Applies to every goto on this page
+    await page.route("**/*", block_heavy_resources)
+    return page
+
+async def warm_up_page(page):
+    """Opens the site's main page so the (per-page) browser context holds a search session."""
+    await page.goto(MAIN_PAGE_URL, wait_until="domcontentloaded")
+
+def parse_tender_page(content: str, page_number: int) -> Tuple[Optional[str], Optional[bytes]]:
+    """
+    Parses a fetched list page into tagged tender blocks ("--- NO RECORDS ---" past the last page, None if unusable)
+    and the page's fingerprint for duplicate detection.
+    """
+    tagged_blocks: List[str] = []; tender_ids: List[str] = []
+    # Every tender row's id starts with "informal": without it the page has no rows, and if it also carries a
+    # no-records message there is nothing to parse
+    if "informal" not in content:
+        content_lower = content.lower()
+        if "no records found" in content_lower or "no tenders available" in content_lower: return "--- NO RECORDS ---", None
+    # lxml tree + XPath: no Python-level wrapper per tag. lxml rejects str input carrying an <?xml ... encoding?>
+    # declaration, so parse the (already decoded) text as UTF-8 bytes. The encoding is fixed explicitly: any declared
+    # charset no longer applies, and undeclared bytes would otherwise be guessed as Latin-1. Parsers are not
+    # thread-safe and this runs in worker threads, hence one per call.
+    root = html.fromstring(content.encode("utf-8"), parser=html.HTMLParser(encoding="utf-8"))
+    tender_tables = TENDER_TABLE_XPATH(root)
+
+    if not tender_tables:
+        body_text_lower = root.text_content().lower()
+        if "no records found" in body_text_lower or "no tenders available" in body_text_lower:
+            return "--- NO RECORDS ---", None
+        logging.warning("  ⚠️ Could not find table with id='table' on page %s. Skipping.", page_number)
+        return None, None
+
+    tender_rows = TENDER_ROWS_XPATH(tender_tables[0])
+    logging.debug("  Found %s tender rows on page %s.", len(tender_rows), page_number)
+    if not tender_rows:
+        # The phrases appear verbatim in the raw HTML, so no need to rebuild the page text
+        if "No Records Found" in content or "No Tenders Available" in content:
+            return "--- NO RECORDS ---", None
+        else: return None, None # Table exists but no data rows
+
+    for row in tender_rows:
+        cols = CELLS_XPATH(row)
+        if len(cols) < 6: continue
+
+        serial_no = get_safe_text(cols[0])
+        epub_date = get_safe_text(cols[1])
+        closing_date = get_safe_text(cols[2])
+        opening_date = get_safe_text(cols[3])
+        org_chain = get_safe_text(cols[5])
+        title_id_cell = cols[4]
+
+        title = "N/A"
+        tender_id_content = "N/A"
+        tender_link = "N/A" # <-- Variable for the link
+
+        cell_text = get_cell_lines(title_id_cell)
+
+        # --- Extract Link First ---
+        link_tags = LINK_XPATH(title_id_cell)
+        if link_tags:
+            link_tag = link_tags[0]
+            relative_href = link_tag.get('href', '')
+            if relative_href:
+                # Construct absolute URL
+                tender_link = urljoin(SITE_DOMAIN, relative_href)
+            # Use link text as primary candidate for title
+            title = get_safe_text(link_tag)
+
+        # --- Strict ID Logic ---
+        found_id_content = ""
+        found_id_bracket = ""
+        all_brackets = [] # Stripped contents of every bracket, in order
+        for bracket_match in CELL_BRACKET_REGEX.finditer(cell_text):
+            id_content = bracket_match.group("id")
+            if id_content and not found_id_content:
+                found_id_content = id_content
+                found_id_bracket = f"[{id_content}]"
+                tender_id_content = found_id_content
+            all_brackets.append(id_content or bracket_match.group("other"))
+
+        # --- Refine Title ---
+        # If link text was the ID, reset title
+        if title != "N/A" and title == found_id_bracket:
+            title = "N/A"
+
+        # If title still N/A, try first bracket content (that isn't the ID)
+        if title == "N/A":
+            for content_inside_bracket in all_brackets:
+                if content_inside_bracket and content_inside_bracket != found_id_content:
+                    title = content_inside_bracket; break
+
+        # Final title fallback
+        if title == "N/A":
+            first_line = cell_text.partition('\n')[0] # Only the first line; no list of the rest
+            if first_line and first_line != found_id_bracket:
+                title = first_line
+
+        # Construct tagged block including the Link
+        tagged_blocks.append(TAGGED_BLOCK_TEMPLATE.format(
+            serial_no=serial_no, epub_date=epub_date, closing_date=closing_date, opening_date=opening_date,
+            title=title, tender_id=tender_id_content, link=tender_link, department=org_chain,
+        ))
+        tender_ids.append(tender_id_content)
+
+    if not tagged_blocks: return None, None # No rows processed correctly
+    logging.info("  ✅ Page %s processed successfully (HTML parse).", page_number)
+    tagged_page_content = "".join(tagged_blocks).strip() # Joined once rather than re-copied per row
+    return tagged_page_content, page_fingerprint(tender_ids, tagged_page_content)
 
 # === REVISED fetch_single_page with Link Extraction ===
-async def fetch_single_page(page, page_number) -> Tuple[int, Optional[str]]:
-    """Fetches page, parses HTML table, extracts tagged data including links."""
+async def fetch_single_page(page, page_number, warmed: bool) -> Tuple[int, Optional[str], Optional[bytes], bool]:
+    """
+    Fetches page, parses HTML table, extracts tagged data including links.
+    warmed says whether the browser page holds a search session; the updated flag is returned for the next fetch.
+    """
     url = BASE_URL.format(page_number)
-    main_page_url = "https://eprocure.gov.in/eprocure/app"
 
     for attempt in range(1, RETRY_LIMIT + 1):
-        tagged_page_content = ""
         try:
-            logging.info(f"📄 Fetching Page {page_number} (Attempt {attempt}/{RETRY_LIMIT})")
-            await page.goto(main_page_url, wait_until="networkidle", timeout=PAGE_LOAD_TIMEOUT)
-            await page.goto(url, wait_until="networkidle", timeout=PAGE_LOAD_TIMEOUT)
-
-            content = await page.content()
-            if not content: continue
-
-            soup = BeautifulSoup(content, "html.parser")
-            tender_table = soup.find("table", id="table")
-
-            if not tender_table:
-                body_text_lower = soup.body.get_text(separator=' ', strip=True).lower() if soup.body else ""
-                if "no records found" in body_text_lower or "no tenders available" in body_text_lower:
-                    return page_number, "--- NO RECORDS ---"
-                logging.warning(f"  ⚠️ Could not find table with id='table' on page {page_number}. Skipping.")
-                return page_number, None
-
-            tender_rows = tender_table.find_all("tr", id=re.compile(r"informal"))
-            logging.debug(f"  Found {len(tender_rows)} tender rows on page {page_number}.")
-            if not tender_rows:
-                 if "No Records Found" in soup.get_text() or "No Tenders Available" in soup.get_text():
-                     return page_number, "--- NO RECORDS ---"
-                 else: return page_number, None # Table exists but no data rows
-
-            for row in tender_rows:
-                cols = row.find_all("td")
-                if len(cols) < 6: continue
-
-                serial_no = get_safe_text(cols[0])
-                epub_date = get_safe_text(cols[1])
-                closing_date = get_safe_text(cols[2])
-                opening_date = get_safe_text(cols[3])
-                org_chain = get_safe_text(cols[5])
-                title_id_cell = cols[4]
-
-                title = "N/A"
-                tender_id_content = "N/A"
-                tender_link = "N/A" # <-- Variable for the link
-
-                cell_text = title_id_cell.get_text(separator='\n', strip=True)
-
-                # --- Extract Link First ---
-                link_tag = title_id_cell.find("a")
-                if link_tag:
-                    relative_href = link_tag.get('href', '')
-                    if relative_href:
-                        # Construct absolute URL
-                        tender_link = urljoin(SITE_DOMAIN, relative_href)
-                    # Use link text as primary candidate for title
-                    title = link_tag.get_text(strip=True)
-
-                # --- Strict ID Logic ---
-                found_id_content = ""
-                found_id_bracket = ""
-                all_brackets = BRACKET_CONTENT_REGEX.findall(cell_text)
-                for content_inside_bracket in all_brackets:
-                    content_inside_bracket = content_inside_bracket.strip()
-                    if STRICT_ID_CONTENT_REGEX.match(content_inside_bracket):
-                        found_id_content = content_inside_bracket
-                        found_id_bracket = f"[{content_inside_bracket}]"
-                        tender_id_content = found_id_content
-                        break
-
-                # --- Refine Title ---
-                # If link text was the ID, reset title
-                if title != "N/A" and title == found_id_bracket:
-                    title = "N/A"
-
-                # If title still N/A, try first bracket content (that isn't the ID)
-                if title == "N/A":
-                    for content_inside_bracket in all_brackets:
-                         content_inside_bracket = content_inside_bracket.strip()
-                         current_bracket = f"[{content_inside_bracket}]"
-                         if content_inside_bracket and current_bracket != found_id_bracket:
-                             title = content_inside_bracket; break
-
-                # Final title fallback
-                if title == "N/A":
-                    first_line = cell_text.split('\n')[0]
-                    if first_line and first_line != found_id_bracket:
-                        title = first_line
-
-                # Construct tagged block including the Link
-                tagged_block = (
-                    f"{serial_no}\n"
-                    f"<Date>{epub_date}</Date>\n"
-                    f"<Date>{closing_date}</Date>\n"
-                    f"<Date>{opening_date}</Date>\n"
-                    f"<Title>{title}</Title>\n"
-                    f"<ID>{tender_id_content}</ID>\n"
-                    f"<Link>{tender_link}</Link>\n" # <-- Added Link tag
-                    f"<Department>{org_chain}</Department>\n"
-                )
-                tagged_page_content += "--- TENDER START ---\n" + tagged_block + "--- TENDER END ---\n\n"
-
-            if not tagged_page_content: return page_number, None # No rows processed correctly
-            logging.info(f"  ✅ Page {page_number} processed successfully (HTML parse).")
-            return page_number, tagged_page_content.strip()
-
-        except PlaywrightTimeout: logging.warning(f"  ⚠️ Timeout on Page {page_number}, attempt {attempt}.")
+            logging.info("📄 Fetching Page %s (Attempt %s/%s)", page_number, attempt, RETRY_LIMIT)
+            fresh_session = not warmed
+            if not warmed: await warm_up_page(page); warmed = True # (Re)opens the search session
+            # The list is server-rendered: fetch the HTML over the page's own HTTP client (shares its session cookies)
+            # without rendering it; only fall back to loading it in the browser if the site refuses the plain request.
+            # A 2xx reply can still be a session-timeout/error page: that shows up as an unusable parse below
+            response = await page.request.get(url, timeout=PAGE_LOAD_TIMEOUT); fetched_via = f"HTTP {response.status}"
+            if response.ok: content = await response.text()
+            else:
+                logging.info("  HTTP %s for Page %s; loading it in the browser instead.", response.status, page_number)
+                await page.goto(url, wait_until="domcontentloaded"); fetched_via = "browser load"
+                content = await page.content()
+            if content:
+                # CPU-bound parse runs in a worker thread (lxml releases the GIL) so other pages keep fetching meanwhile
+                tagged_page_content, fingerprint = await asyncio.to_thread(parse_tender_page, content, page_number)
+                if tagged_page_content == "--- NO RECORDS ---" and not fresh_session and attempt < RETRY_LIMIT:
+                    # An expired session can look like the end of the list: confirm on a fresh session before the run stops
+                    logging.info("  No records on Page %s; re-checking with a fresh session.", page_number); warmed = False; continue
+                if tagged_page_content is not None: return page_number, tagged_page_content, fingerprint, warmed
+            # Empty or unparseable, whichever way it was fetched (e.g. a session-expired page): open a new session and try again
+            logging.warning("  ⚠️ No usable tender table on Page %s (%s), attempt %s.", page_number, fetched_via, attempt)
+
+        except PlaywrightTimeout: logging.warning("  ⚠️ Timeout on Page %s, attempt %s.", page_number, attempt)
         except Exception as e:
-            logging.error(f"  ❌ Error fetching/processing Page {page_number}, attempt {attempt}: {type(e).__name__} - {e}")
-            import traceback; logging.error(traceback.format_exc())
+            logging.exception("  ❌ Error fetching/processing Page %s, attempt %s: %s - %s", page_number, attempt, type(e).__name__, e)
+        warmed = False # Whatever failed (warm-up included), the next attempt starts from a fresh session
 
         if attempt < RETRY_LIMIT:
             wait_time = 2 ** attempt
-            logging.info(f"  Retrying page {page_number} in {wait_time} seconds...")
+            logging.info("  Retrying page %s in %s seconds...", page_number, wait_time)
             await asyncio.sleep(wait_time)
 
-    logging.error(f"  ❌ Failed to process Page {page_number} after {RETRY_LIMIT} attempts.")
-    return page_number, None
+    logging.error("  ❌ Failed to process Page %s after %s attempts.", page_number, RETRY_LIMIT)
+    return page_number, None, None, warmed
 
 
-# --- fetch_pages_concurrently (No change needed) ---
+# --- fetch_pages_concurrently: one worker per browser page, pulling page numbers as it frees up ---
 async def fetch_pages_concurrently(playwright):
-    # ... (identical to previous version) ...
     browser = await playwright.chromium.launch(headless=True)
-    all_page_results: Dict[int, str] = {}
+    all_page_results: Dict[int, Tuple[str, bytes]] = {}
     try:
-        pages = await asyncio.gather(*[browser.new_page() for _ in range(CONCURRENCY)])
-        logging.info(f"Launched {CONCURRENCY} browser pages.")
-        last_valid_content_hash = None; stop_fetching = False; current_page_num = 1
-        while current_page_num <= MAX_PAGES_TO_FETCH and not stop_fetching:
-            tasks = []; batch_start_page = current_page_num
-            for i in range(CONCURRENCY):
-                if current_page_num > MAX_PAGES_TO_FETCH: break
-                tasks.append(fetch_single_page(pages[i], current_page_num))
-                current_page_num += 1
-            if not tasks: break
-            logging.info(f"🚀 Fetching batch: Pages {batch_start_page} to {current_page_num - 1}")
-            results = await asyncio.gather(*tasks)
-            for page_number, tagged_content in results:
-                if tagged_content is None: logging.warning(f"  ⚠️ Page {page_number} failed."); continue
-                if tagged_content == "--- NO RECORDS ---": logging.info(f"🛑 Stopping: No records on page {page_number}."); stop_fetching = True; break
-                current_content_hash = hash(tagged_content)
-                if last_valid_content_hash is not None and current_content_hash == last_valid_content_hash: logging.info(f"🛑 Stopping: Duplicate on page {page_number}."); stop_fetching = True; break
-                save_path = RAW_PAGES_DIR / f"Page_{page_number}.txt"
-                try:
-                    save_path.write_text(tagged_content, encoding="utf-8"); all_page_results[page_number] = "Saved"
-                    last_valid_content_hash = current_content_hash; logging.debug(f"  Saved: {save_path}")
-                except OSError as e: logging.error(f"  ❌ Failed save {save_path}: {e}")
-            if stop_fetching: break
+        pages = await asyncio.gather(*[open_worker_page(browser) for _ in range(CONCURRENCY)])
+        logging.info("Launched %s browser pages.", CONCURRENCY)
+
+        page_numbers = iter(range(1, MAX_PAGES_TO_FETCH + 1)) # Shared by all workers
+        finished_pages: Dict[int, Tuple[Optional[str], Optional[bytes]]] = {}
+        stop_fetching = asyncio.Event()
+        next_page_to_commit = 1; last_valid_fingerprint = None; no_records_page = MAX_PAGES_TO_FETCH + 1
+
+        def commit_finished_pages():
+            """Handles finished pages strictly in page order, so the stop conditions see pages in sequence."""
+            nonlocal next_page_to_commit, last_valid_fingerprint
+            while next_page_to_commit in finished_pages and not stop_fetching.is_set():
+                page_number = next_page_to_commit; next_page_to_commit += 1
+                tagged_content, fingerprint = finished_pages.pop(page_number)
+                if tagged_content is None: logging.warning("  ⚠️ Page %s failed.", page_number); continue
+                if tagged_content == "--- NO RECORDS ---": logging.info("🛑 Stopping: No records on page %s.", page_number); stop_fetching.set(); break
+                if last_valid_fingerprint is not None and fingerprint == last_valid_fingerprint: logging.info("🛑 Stopping: Duplicate on page %s.", page_number); stop_fetching.set(); break
+                all_page_results[page_number] = (tagged_content, fingerprint) # Kept in memory; written once by merge_and_cleanup
+                last_valid_fingerprint = fingerprint; logging.debug("  Kept: Page %s", page_number)
+
+        async def fetch_worker(page):
+            nonlocal no_records_page
+            pages_in_context = 0; warmed = False # Warmed up by the first fetch, and again whenever a fetch fails
+            for page_number in page_numbers:
+                # Pages past a "no records" page are empty too, even while earlier pages are still in flight
+                if stop_fetching.is_set() or page_number > no_records_page: break
+                if pages_in_context >= PAGES_PER_CONTEXT:
+                    fresh_page = None
+                    try:
+                        fresh_page = await open_worker_page(browser) # Opened first: the old page stays usable if this fails
+                        await page.context.close(); page = fresh_page
+                        warmed = False # No session in the new context yet; the next fetch warms it up
+                    except Exception as e:
+                        logging.warning("  ⚠️ Browser context recycle before page %s failed: %s - %s", page_number, type(e).__name__, e)
+                        if fresh_page is not None and fresh_page is not page:
+                            try: await fresh_page.context.close() # Don't leak the unused context
+                            except Exception as close_error: logging.warning("  ⚠️ Could not close unused browser context: %s", close_error)
+                    pages_in_context = 0
+                _, tagged_content, fingerprint, warmed = await fetch_single_page(page, page_number, warmed); pages_in_context += 1
+                if tagged_content == "--- NO RECORDS ---": no_records_page = min(no_records_page, page_number)
+                finished_pages[page_number] = (tagged_content, fingerprint)
+                commit_finished_pages()
+
+        logging.info("🚀 Fetching up to %s pages with %s workers", MAX_PAGES_TO_FETCH, CONCURRENCY)
+        await asyncio.gather(*[fetch_worker(page) for page in pages])
     finally:
         if browser: logging.info("Closing browser."); await browser.close()
-    logging.info(f"Fetching complete. Saved {len(all_page_results)} intermediate pages.")
+    logging.info("Fetching complete. Collected %s pages.", len(all_page_results))
     return all_page_results
 
 
-# --- merge_and_cleanup (No change needed) ---
-async def merge_and_cleanup() -> Tuple[int, Optional[Path]]:
-    # ... (identical to previous version) ...
-    today_filename_str = datetime.datetime.now().strftime("%Y-%m-%d")
-    final_output_path = BASE_DATA_DIR / f"Final_Tender_List_{today_filename_str}.txt"
-    merged_count = 0; seen_content_hashes: Set[int] = set()
-    logging.info(f"Merging into: {final_output_path}, from: {RAW_PAGES_DIR}")
-    if not RAW_PAGES_DIR.is_dir(): logging.warning("Raw pages dir not found."); return 0, None
-    try:
-        page_files = sorted([p for p in RAW_PAGES_DIR.glob("Page_*.txt") if p.is_file()], key=lambda p: natural_sort_key(p.name))
-        page_files_count = len(page_files); logging.info(f"Found {page_files_count} raw pages.")
-    except OSError as e: logging.error(f"Error listing files: {e}"); return 0, None
-    if not page_files: logging.warning("No raw page files found."); return 0, None
+# --- merge_and_cleanup: pages are merged from memory and written once ---
+async def merge_and_cleanup(page_results: Dict[int, Tuple[str, bytes]]) -> Tuple[int, Optional[Path]]:
+    final_output_path = BASE_DATA_DIR / f"Final_Tender_List_{TODAY_STR}.txt" # Run's start date, same as the log header
+    merged_count = 0; seen_fingerprints: Set[bytes] = set(); merged_pages: List[str] = []
+    logging.info("Merging %s pages into: %s", len(page_results), final_output_path)
+    if not page_results: logging.warning("No pages fetched."); return 0, None
+    for page_number, (content, fingerprint) in sorted(page_results.items()):
+        if not content: logging.warning("Skipping empty: Page %s", page_number); continue
+        if fingerprint not in seen_fingerprints:
+            merged_pages.append(content + "\n\n"); seen_fingerprints.add(fingerprint); merged_count += 1
+            logging.debug("Merged unique: Page %s", page_number)
+        else: logging.info("Skipping duplicate: Page %s", page_number)
     try:
-        with open(final_output_path, "w", encoding="utf-8") as outfile:
-            for page_path in page_files:
-                try:
-                    content = page_path.read_text(encoding="utf-8").strip()
-                    if not content: logging.warning(f"Skipping empty: {page_path.name}"); page_path.unlink(); continue
-                    content_hash = hash(content)
-                    if content_hash not in seen_content_hashes:
-                        outfile.write(content + "\n\n"); seen_content_hashes.add(content_hash); merged_count += 1
-                        logging.debug(f"Merged unique: {page_path.name}")
-                    else: logging.info(f"Skipping duplicate: {page_path.name}")
-                    page_path.unlink(); logging.debug(f"Deleted raw: {page_path.name}")
-                except Exception as e: logging.error(f"Error processing {page_path.name}: {e}")
-        logging.info(f"✅ Merged {merged_count} unique pages to: {final_output_path}")
+        await asyncio.to_thread(final_output_path.write_text, "".join(merged_pages), encoding="utf-8") # Off the event loop
+        logging.info("✅ Merged %s unique pages to: %s", merged_count, final_output_path)
         return merged_count, final_output_path
-    except Exception as e: logging.error(f"Failed merge/write: {e}"); return merged_count, None
+    except Exception as e: logging.error("Failed merge/write: %s", e); return merged_count, None
 
 
-# --- scrape_all_pages (No change needed) ---
+# --- scrape_all_pages: fetch into memory, merge once, log the run's duration ---
 async def scrape_all_pages():
-    # ... (identical to previous version) ...
-    start_time = datetime.datetime.now(); merged_count = 0; final_output_file = None
+    start_time = time.perf_counter(); merged_count = 0; final_output_file = None
     try:
         async with async_playwright() as p:
-            logging.info("🚀 Starting scrape"); await fetch_pages_concurrently(p)
-        merged_count, final_output_file = await merge_and_cleanup()
-    except Exception as e: logging.error(f"💥 CRITICAL ERROR: {type(e).__name__} - {e}"); import traceback; logging.error(traceback.format_exc())
+            logging.info("🚀 Starting scrape"); page_results = await fetch_pages_concurrently(p)
+        merged_count, final_output_file = await merge_and_cleanup(page_results)
+    except Exception as e: logging.exception("💥 CRITICAL ERROR: %s - %s", type(e).__name__, e)
     finally:
-        end_time = datetime.datetime.now(); duration = (end_time - start_time).total_seconds()
+        duration = time.perf_counter() - start_time # Monotonic: unaffected by clock changes
         log_status = "completed" if merged_count > 0 else "failed/no output"
-        logging.info(f"🏁 Scrape run {log_status}. Duration: {datetime.timedelta(seconds=duration)}. Merged: {merged_count}.")
-        if final_output_file: logging.info(f"   Final output: {final_output_file}")
+        logging.info("🏁 Scrape run %s. Duration: %s. Merged: %s.", log_status, datetime.timedelta(seconds=duration), merged_count)
+        if final_output_file: logging.info("   Final output: %s", final_output_file)
         else: logging.warning("   Final output file NOT created.")
 
 if __name__ == "__main__":
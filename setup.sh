@@ -80,16 +80,14 @@ log_info "Using Uvicorn: $UVICORN_EXEC"
 log_info "Creating necessary data and log directories..."
 BASE_DATA_DIR="$SCRIPT_DIR/scraped_data"
 FILTERED_PATH="$BASE_DATA_DIR/Filtered Tenders" # Used by dashboard.py
-RAW_PAGES_DIR="$BASE_DATA_DIR/RawPages"       # Used by scrape.py
 LOG_DIR="$SCRIPT_DIR/logs"                  # Used by scrape.py & cron
 
 # Create all directories, including parents (-p), fail script if any creation fails
-mkdir -p "$BASE_DATA_DIR" "$FILTERED_PATH" "$RAW_PAGES_DIR" "$LOG_DIR" || log_error "Failed to create one or more directories."
+mkdir -p "$BASE_DATA_DIR" "$FILTERED_PATH" "$LOG_DIR" || log_error "Failed to create one or more directories."
 
 # Add READMEs for clarity
 echo "Base directory for scraped data." > "$BASE_DATA_DIR/README.md"
 echo "Stores filtered tender sets created via the dashboard." > "$FILTERED_PATH/README.md"
-echo "Stores intermediate raw pages fetched by scrape.py." > "$RAW_PAGES_DIR/README.md"
 echo "Contains logs, primarily from the scraper cron job." > "$LOG_DIR/README.md"
 log_info "Directories created successfully."
 